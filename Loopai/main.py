@@ -1,22 +1,51 @@
 import asyncio
-import uuid
+import logging
+import os
+import random
+import sqlite3
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Dict
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, conlist
+from itertools import count, islice
+from typing import Annotated, List, Dict, Optional
+import orjson
+from cachetools import TTLCache
+import redis.asyncio as redis
+import uvicorn
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field, conlist
+from ulid import ULID
 from datetime import datetime
-import heapq
 import time
 
-app = FastAPI()
+try:
+    from itertools import batched
+except ImportError:  # Python < 3.12
+    def batched(iterable, n):
+        it = iter(iterable)
+        while chunk := tuple(islice(it, n)):
+            yield chunk
+
+app = FastAPI(default_response_class=ORJSONResponse)
+logger = logging.getLogger(__name__)
 
 class Priority(str, Enum):
     HIGH = "HIGH"
     MEDIUM = "MEDIUM"
     LOW = "LOW"
 
+# Range checked by pydantic-core alongside the type check
+IdType = Annotated[int, Field(ge=1, le=10**9 + 7)]
+
+# Queue priority per level; lower values are dequeued first
+_PRIO: Dict[Priority, int] = {Priority.HIGH: 0, Priority.MEDIUM: 1, Priority.LOW: 2}
+
 class IngestionRequest(BaseModel):
-    ids: conlist(int, min_items=1, max_items=1000)
+    model_config = ConfigDict(frozen=True)
+
+    ids: conlist(IdType, min_length=1, max_length=1000)
     priority: Priority = Priority.MEDIUM
 
 class BatchStatus(str, Enum):
@@ -24,111 +53,452 @@ class BatchStatus(str, Enum):
     TRIGGERED = "triggered"
     COMPLETED = "completed"
 
-# In-memory storage
-ingestion_jobs: Dict[str, dict] = {}
-task_queue = []
-processing_lock = asyncio.Lock()
-is_processing = False
+# In-memory records store a status as its index in BATCH_STATUSES
+BATCH_STATUSES = (BatchStatus.YET_TO_START, BatchStatus.TRIGGERED, BatchStatus.COMPLETED)
+_BATCH_STATUS_INT: Dict[BatchStatus, int] = {status: i for i, status in enumerate(BATCH_STATUSES)}
+_YET_TO_START, _TRIGGERED, _COMPLETED = range(len(BATCH_STATUSES))
+
+@dataclass(slots=True)
+class Batch:
+    ids: array  # array("i"): every valid ID fits in 32 bits
+    status: int = _YET_TO_START
+
+@dataclass(slots=True)
+class Job:
+    batches: Dict[str, Batch]
+    priority: Priority
+    created_time: float  # Wall clock, for display
+    status: int = _YET_TO_START
+    # Number of batches per status, indexed like BATCH_STATUSES
+    counts: List[int] = field(init=False)
+    # Serialized /status body, rebuilt lazily after a batch changes status
+    cached_json: Optional[bytes] = None
+
+    def __post_init__(self):
+        self.counts = [len(self.batches), 0, 0]
+
+# In-memory storage, sharded by ingestion ID. Batches only touch their own
+# ingestion's record, so each shard's lock only guards the ingestions in it.
+SHARDS = 16
+_shards: List[Dict[str, Job]] = [{} for _ in range(SHARDS)]
+_locks: List[asyncio.Lock] = [asyncio.Lock() for _ in range(SHARDS)]
+task_queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+# Enqueue order; breaks priority ties with an int compare and keeps them FIFO
+_seq = count()
+
+def _shard(ingestion_id: str) -> Dict[str, Job]:
+    return _shards[hash(ingestion_id) % SHARDS]
+
+def _shard_lock(ingestion_id: str) -> asyncio.Lock:
+    return _locks[hash(ingestion_id) % SHARDS]
+
+# Completed ingestions leave the shards: their final (etag, /status body) is
+# written to SQLite, kept there for ARCHIVE_RETENTION seconds, and the most
+# recently used ones stay cached in memory
+COMPLETED_CACHE_SIZE = 10000
+COMPLETED_CACHE_TTL = 3600
+ARCHIVE_DB_PATH = os.environ.get("ARCHIVE_DB_PATH", "ingestions.db")
+ARCHIVE_RETENTION = 24 * 3600
+completed_jobs = TTLCache(maxsize=COMPLETED_CACHE_SIZE, ttl=COMPLETED_CACHE_TTL)
+# SQLite is only used from this one thread, off the event loop. The connection
+# is opened on first use, so importing main does not create the file.
+_archive_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+_archive_db: Optional[sqlite3.Connection] = None
+
+def _open_archive_db(create: bool) -> Optional[sqlite3.Connection]:
+    global _archive_db
+    if _archive_db is None:
+        if not create and not os.path.exists(ARCHIVE_DB_PATH):
+            return None
+        db = sqlite3.connect(ARCHIVE_DB_PATH)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS completed_ingestions "
+            "(ingestion_id TEXT PRIMARY KEY, etag TEXT NOT NULL, body BLOB NOT NULL, completed_at REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS completed_ingestions_completed_at "
+            "ON completed_ingestions (completed_at)"
+        )
+        _archive_db = db
+    return _archive_db
+
+def _write_archive(ingestion_id: str, etag: str, body: bytes):
+    db = _open_archive_db(create=True)
+    now = time.time()
+    db.execute("INSERT OR REPLACE INTO completed_ingestions VALUES (?, ?, ?, ?)", (ingestion_id, etag, body, now))
+    db.execute("DELETE FROM completed_ingestions WHERE completed_at < ?", (now - ARCHIVE_RETENTION,))
+    db.commit()
+
+def _read_archive(ingestion_id: str) -> Optional[tuple]:
+    db = _open_archive_db(create=False)
+    if db is None:
+        return None
+    row = db.execute(
+        "SELECT etag, body FROM completed_ingestions WHERE ingestion_id = ? AND completed_at >= ?",
+        (ingestion_id, time.time() - ARCHIVE_RETENTION),
+    ).fetchone()
+    return None if row is None else (row[0], row[1])
+
+# Optional shared storage: with REDIS_URL set, ingestions and the batch queue
+# live in Redis instead of the shards above, so several processes can serve them
+REDIS_URL = os.environ.get("REDIS_URL")
+redis_client = redis.from_url(REDIS_URL) if REDIS_URL else None
+REDIS_QUEUE_KEY = "jobs:queue"
+REDIS_SEQ_KEY = "jobs:seq"
+REDIS_RATE_LIMIT_KEY = "jobs:next_dispatch"
+
+# Server processes started by `python main.py` (uvicorn also reads
+# WEB_CONCURRENCY as its default --workers)
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1")) if REDIS_URL else 1
+
+# Number of worker coroutines processing batches released by the dispatcher
+BATCH_WORKERS = 4
+
+# Rate limit: 1 batch per 5 seconds, no bursting beyond a single batch
+RATE_LIMIT_PER_SECOND = 0.2
+RATE_LIMIT_BURST = 1
+
+@dataclass
+class TokenBucket:
+    rate: float
+    capacity: float
+    tokens: float = field(init=False)
+    # Monotonic clock: wall-clock jumps (e.g. NTP) must not mint or lose tokens
+    last_refill: float = field(default_factory=time.monotonic)
 
-# Simulate external API call
-async def simulate_external_api(id: int):
+    def __post_init__(self):
+        self.tokens = self.capacity
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    # Take a token if one is available; otherwise return the seconds until one is
+    async def try_acquire(self) -> float:
+        self.refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+# Shared limit for every process on the same Redis: the key holds the earliest
+# time (Redis server clock) the next batch may be dispatched. Burst is one batch.
+_REDIS_RATE_LIMIT_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local next_at = tonumber(redis.call('GET', KEYS[1]) or '0')
+if next_at > now then
+    return tostring(next_at - now)
+end
+redis.call('SET', KEYS[1], tostring(now + tonumber(ARGV[1])))
+return '0'
+"""
+
+class RedisRateLimiter:
+    def __init__(self, client, rate: float):
+        self.interval = 1 / rate
+        self.script = client.register_script(_REDIS_RATE_LIMIT_SCRIPT)
+
+    # Same contract as TokenBucket.try_acquire
+    async def try_acquire(self) -> float:
+        return float(await self.script(keys=[REDIS_RATE_LIMIT_KEY], args=[self.interval]))
+
+# With Redis the limit is shared, so it holds however many processes are started
+if redis_client is not None:
+    rate_limiter = RedisRateLimiter(redis_client, RATE_LIMIT_PER_SECOND)
+else:
+    rate_limiter = TokenBucket(rate=RATE_LIMIT_PER_SECOND, capacity=RATE_LIMIT_BURST)
+
+# Simulate a bulk external API call: one round trip for the whole batch
+async def simulate_external_api_bulk(ids: List[int]) -> List[dict]:
     await asyncio.sleep(1)  # Simulate network delay
-    return {"id": id, "data": "processed"}
+    return [{"id": id, "data": "processed"} for id in ids]
 
 # Process a batch
 async def process_batch(ingestion_id: str, batch_id: str, ids: List[int]):
-    async with processing_lock:
-        ingestion_jobs[ingestion_id]["batches"][batch_id]["status"] = BatchStatus.TRIGGERED
-        results = []
-        for id in ids:
-            result = await simulate_external_api(id)
-            results.append(result)
-        ingestion_jobs[ingestion_id]["batches"][batch_id]["status"] = BatchStatus.COMPLETED
-        update_ingestion_status(ingestion_id)
+    # Three phases: mark TRIGGERED, call the external API, mark COMPLETED.
+    # Only the transitions take the ingestion's lock; the external calls run
+    # without it so other batches are not blocked behind this one.
+    await transition_batch(ingestion_id, batch_id, BatchStatus.YET_TO_START, BatchStatus.TRIGGERED)
+
+    results = await simulate_external_api_bulk(ids)
+
+    await transition_batch(ingestion_id, batch_id, BatchStatus.TRIGGERED, BatchStatus.COMPLETED)
     return results
 
-# Update overall ingestion status
+async def transition_batch(ingestion_id: str, batch_id: str, old: BatchStatus, new: BatchStatus):
+    if redis_client is not None:
+        await redis_set_batch_status(ingestion_id, batch_id, old, new)
+        return
+    async with _shard_lock(ingestion_id):
+        set_batch_status(ingestion_id, batch_id, _BATCH_STATUS_INT[new])
+        completed = _shard(ingestion_id)[ingestion_id].status == _COMPLETED
+    # Archiving writes to SQLite, so it runs after the shard lock is released
+    if completed:
+        await archive_ingestion(ingestion_id)
+
+# Move a batch to a new status and keep the per-status counts in step
+def set_batch_status(ingestion_id: str, batch_id: str, status: int):
+    job = _shard(ingestion_id)[ingestion_id]
+    batch = job.batches[batch_id]
+    counts = job.counts
+    counts[batch.status] -= 1
+    counts[status] += 1
+    batch.status = status
+    job.cached_json = None
+    update_ingestion_status(ingestion_id)
+
+# Update overall ingestion status from the per-status counts
 def update_ingestion_status(ingestion_id: str):
-    batches = ingestion_jobs[ingestion_id]["batches"]
-    statuses = [batch["status"] for batch in batches.values()]
-    
-    if all(status == BatchStatus.COMPLETED for status in statuses):
-        ingestion_jobs[ingestion_id]["status"] = BatchStatus.COMPLETED
-    elif any(status == BatchStatus.TRIGGERED for status in statuses):
-        ingestion_jobs[ingestion_id]["status"] = BatchStatus.TRIGGERED
+    job = _shard(ingestion_id)[ingestion_id]
+    job.status = overall_status(job.counts, len(job.batches))
+
+def status_body(ingestion_id: str, job: Job) -> bytes:
+    return orjson.dumps({
+        "ingestion_id": ingestion_id,
+        "status": BATCH_STATUSES[job.status],
+        "batches": [
+            {
+                "batch_id": batch_id,
+                "ids": batch.ids.tolist(),
+                "status": BATCH_STATUSES[batch.status]
+            }
+            for batch_id, batch in job.batches.items()
+        ]
+    })
+
+# Move a completed ingestion out of the shards; its status can no longer change
+async def archive_ingestion(ingestion_id: str):
+    job = _shard(ingestion_id).pop(ingestion_id)
+    entry = (f'"{status_version(job.counts)}"', status_body(ingestion_id, job))
+    completed_jobs[ingestion_id] = entry
+    await asyncio.get_running_loop().run_in_executor(_archive_executor, _write_archive, ingestion_id, *entry)
+
+async def load_archived(ingestion_id: str) -> Optional[tuple]:
+    entry = completed_jobs.get(ingestion_id)
+    if entry is None:
+        entry = await asyncio.get_running_loop().run_in_executor(_archive_executor, _read_archive, ingestion_id)
+        if entry is not None:
+            completed_jobs[ingestion_id] = entry
+    return entry
+
+# Every batch transition bumps this by one, so it identifies a /status snapshot
+def status_version(counts: List[int]) -> int:
+    return counts[_TRIGGERED] + 2 * counts[_COMPLETED]
+
+def overall_status(counts: List[int], total: int) -> int:
+    if counts[_COMPLETED] == total:
+        return _COMPLETED
+    elif counts[_TRIGGERED] > 0 or counts[_COMPLETED] > 0:
+        return _TRIGGERED
     else:
-        ingestion_jobs[ingestion_id]["status"] = BatchStatus.YET_TO_START
+        return _YET_TO_START
+
+# Redis storage. Per ingestion:
+#   ingest:<id>               hash: created_time, priority, total
+#   ingest:<id>:batches       list: [batch_id, ids] in creation order
+#   ingest:<id>:batch_status  hash: batch_id -> status
+#   ingest:<id>:counts        hash: status -> number of batches
+# Queued batches are members of the jobs:queue sorted set, scored by
+# priority and then a per-batch sequence number from jobs:seq, so batches of
+# equal priority dequeue FIFO. Scores stay exact integers below 2**53.
+def _redis_queue_score(priority_value: int, seq: int) -> int:
+    return priority_value * 2**40 + seq
+
+async def redis_create_ingestion(ingestion_id: str, batches: Dict[str, tuple], priority: Priority, priority_value: int):
+    key = f"ingest:{ingestion_id}"
+    first_seq = await redis_client.incrby(REDIS_SEQ_KEY, len(batches)) - len(batches) + 1
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={"created_time": time.time(), "priority": priority.value, "total": len(batches)})
+        pipe.rpush(f"{key}:batches", *(orjson.dumps([batch_id, ids]) for batch_id, ids in batches.items()))
+        pipe.hset(f"{key}:batch_status", mapping={batch_id: BatchStatus.YET_TO_START.value for batch_id in batches})
+        pipe.hset(f"{key}:counts", mapping={
+            BatchStatus.YET_TO_START.value: len(batches),
+            BatchStatus.TRIGGERED.value: 0,
+            BatchStatus.COMPLETED.value: 0,
+        })
+        pipe.zadd(REDIS_QUEUE_KEY, {
+            orjson.dumps([ingestion_id, batch_id, ids]): _redis_queue_score(priority_value, first_seq + n)
+            for n, (batch_id, ids) in enumerate(batches.items())
+        })
+        await pipe.execute()
+
+async def redis_next_batch():
+    # Blocks until a batch is queued
+    _, member, score = await redis_client.bzpopmin(REDIS_QUEUE_KEY)
+    return member, score
+
+async def redis_requeue_batch(member: bytes, score: float):
+    await redis_client.zadd(REDIS_QUEUE_KEY, {member: score})
+
+async def redis_set_batch_status(ingestion_id: str, batch_id: str, old: BatchStatus, new: BatchStatus):
+    key = f"ingest:{ingestion_id}"
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(f"{key}:batch_status", batch_id, new.value)
+        pipe.hincrby(f"{key}:counts", old.value, -1)
+        pipe.hincrby(f"{key}:counts", new.value, 1)
+        pipe.hget(key, "total")
+        _, _, new_count, total = await pipe.execute()
 
-# Background task to process queue
-async def process_queue():
-    global is_processing
+    # Like archived in-memory ingestions, completed ones are kept for ARCHIVE_RETENTION
+    if new == BatchStatus.COMPLETED and new_count == int(total):
+        async with redis_client.pipeline(transaction=True) as pipe:
+            for ingestion_key in (key, f"{key}:batches", f"{key}:batch_status", f"{key}:counts"):
+                pipe.expire(ingestion_key, ARCHIVE_RETENTION)
+            await pipe.execute()
+
+async def redis_get_version(ingestion_id: str) -> Optional[int]:
+    triggered, completed = await redis_client.hmget(
+        f"ingest:{ingestion_id}:counts", BatchStatus.TRIGGERED.value, BatchStatus.COMPLETED.value
+    )
+    if triggered is None:
+        return None
+    return int(triggered) + 2 * int(completed)
+
+async def redis_get_status(ingestion_id: str):
+    key = f"ingest:{ingestion_id}"
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hget(key, "total")
+        pipe.lrange(f"{key}:batches", 0, -1)
+        pipe.hgetall(f"{key}:batch_status")
+        pipe.hgetall(f"{key}:counts")
+        total, batches, batch_status, counts = await pipe.execute()
+    if total is None:
+        return None
+
+    status_counts = [0] * len(BATCH_STATUSES)
+    for status, n in counts.items():
+        status_counts[_BATCH_STATUS_INT[BatchStatus(status.decode())]] = int(n)
+    result = []
+    for entry in batches:
+        batch_id, ids = orjson.loads(entry)
+        result.append({
+            "batch_id": batch_id,
+            "ids": ids,
+            "status": BatchStatus(batch_status[batch_id.encode()].decode()),
+        })
+    return status_version(status_counts), {
+        "ingestion_id": ingestion_id,
+        "status": BATCH_STATUSES[overall_status(status_counts, int(total))],
+        "batches": result,
+    }
+
+# Batches released by the rate limiter, waiting for a free worker
+dispatched: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+# Background dispatcher: the only place tokens are taken, one per batch
+async def dispatcher():
     while True:
-        async with processing_lock:
-            if not task_queue or is_processing:
-                await asyncio.sleep(0.1)
-                continue
-            
-            is_processing = True
-            _, ingestion_id, batch_id, ids = heapq.heappop(task_queue)
+        try:
+            await dispatch_next()
+        except Exception:
+            logger.exception("Dispatching a batch failed")
+            await asyncio.sleep(1)  # Don't spin if e.g. Redis is down
+
+async def dispatch_next():
+    if redis_client is not None:
+        member, score = await redis_next_batch()
+    else:
+        entry = await task_queue.get()
+
+    # Only take a token once there is a batch to spend it on; a token
+    # held while idle would let an extra batch through when work arrives.
+    wait = await rate_limiter.try_acquire()
+    if wait > 0:
+        # Put the batch back so anything of higher priority queued during
+        # the wait is picked first, and retry once a token is due
+        if redis_client is not None:
+            await redis_requeue_batch(member, score)
+        else:
+            task_queue.put_nowait(entry)
+            task_queue.task_done()
+        # Jitter keeps dispatchers in other processes from waking in lockstep
+        await asyncio.sleep(wait + random.uniform(0, 0.1))
+        return
+
+    if redis_client is not None:
+        ingestion_id, batch_id, ids = orjson.loads(member)
+    else:
+        _, _, ingestion_id, batch_id, ids = entry
+    await dispatched.put((ingestion_id, batch_id, ids))
+
+# Background worker: processes batches the dispatcher has released
+async def worker():
+    while True:
+        ingestion_id, batch_id, ids = await dispatched.get()
+        try:
             await process_batch(ingestion_id, batch_id, ids)
-            is_processing = False
-            await asyncio.sleep(5)  # Rate limit: 1 batch per 5 seconds
+        except Exception:
+            # Keep the worker alive; one failed batch must not shrink the pool
+            logger.exception("Batch %s of ingestion %s failed", batch_id, ingestion_id)
+        finally:
+            if redis_client is None:
+                task_queue.task_done()
 
 # Start queue processing
+worker_tasks: List[asyncio.Task] = []
+
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(process_queue())
+    worker_tasks.append(asyncio.create_task(dispatcher()))
+    for _ in range(BATCH_WORKERS):
+        worker_tasks.append(asyncio.create_task(worker()))
 
 @app.post("/ingest")
 async def ingest_data(request: IngestionRequest):
-    ingestion_id = str(uuid.uuid4())
-    
-    # Validate IDs
-    for id in request.ids:
-        if not (1 <= id <= 10**9 + 7):
-            raise HTTPException(status_code=400, detail=f"ID {id} out of valid range")
+    ingestion_id = str(ULID())
     
     # Create batches of 3 IDs
-    batches = {}
-    for i in range(0, len(request.ids), 3):
-        batch_ids = request.ids[i:i+3]
-        batch_id = str(uuid.uuid4())
-        batches[batch_id] = {
-            "ids": batch_ids,
-            "status": BatchStatus.YET_TO_START
-        }
+    batches = {str(ULID()): ids for ids in batched(request.ids, 3)}
     
+    priority_value = _PRIO[request.priority]
+    if redis_client is not None:
+        await redis_create_ingestion(ingestion_id, batches, request.priority, priority_value)
+        return {"ingestion_id": ingestion_id}
+
     # Store ingestion job
-    ingestion_jobs[ingestion_id] = {
-        "status": BatchStatus.YET_TO_START,
-        "batches": batches,
-        "created_time": time.time(),
-        "priority": request.priority
-    }
+    records = {batch_id: Batch(array("i", ids)) for batch_id, ids in batches.items()}
+    _shard(ingestion_id)[ingestion_id] = Job(records, request.priority, time.time())
     
     # Enqueue batches with priority
-    priority_value = {"HIGH": 0, "MEDIUM": 1, "LOW": 2}[request.priority]
-    for batch_id, batch in batches.items():
-        # Negative priority for max-heap behavior
-        heapq.heappush(task_queue, (-priority_value, ingestion_id, batch_id, batch["ids"]))
+    # Lower value is dequeued first, so HIGH (0) runs before LOW (2)
+    for batch_id, batch in records.items():
+        task_queue.put_nowait((priority_value, next(_seq), ingestion_id, batch_id, batch.ids))
     
     return {"ingestion_id": ingestion_id}
 
 @app.get("/status/{ingestion_id}")
-async def get_status(ingestion_id: str):
-    if ingestion_id not in ingestion_jobs:
-        raise HTTPException(status_code=404, detail="Ingestion ID not found")
+async def get_status(ingestion_id: str, if_none_match: Optional[str] = Header(None)):
+    if redis_client is not None:
+        version = await redis_get_version(ingestion_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Ingestion ID not found")
+        if if_none_match == f'"{version}"':
+            return Response(status_code=304, headers={"ETag": if_none_match})
+        version, status = await redis_get_status(ingestion_id)
+        return ORJSONResponse(status, headers={"ETag": f'"{version}"'})
+
+    job = _shard(ingestion_id).get(ingestion_id)
+    if job is None:
+        archived = await load_archived(ingestion_id)
+        if archived is None:
+            raise HTTPException(status_code=404, detail="Ingestion ID not found")
+        etag, body = archived
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type="application/json", headers={"ETag": etag})
     
-    job = ingestion_jobs[ingestion_id]
-    return {
-        "ingestion_id": ingestion_id,
-        "status": job["status"],
-        "batches": [
-            {
-                "batch_id": batch_id,
-                "ids": batch["ids"],
-                "status": batch["status"]
-            }
-            for batch_id, batch in job["batches"].items()
-        ]
-    }
\ No newline at end of file
+    etag = f'"{status_version(job.counts)}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    if job.cached_json is None:
+        job.cached_json = status_body(ingestion_id, job)
+    return Response(job.cached_json, media_type="application/json", headers={"ETag": etag})
+
+if __name__ == "__main__":
+    # Without Redis, state lives in this process, so it must stay a single worker
+    uvicorn.run("main:app", loop="uvloop", http="httptools", workers=WEB_CONCURRENCY)
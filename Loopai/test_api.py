@@ -1,7 +1,10 @@
 import pytest
 import asyncio
+import fakeredis.aioredis
+import orjson
 from httpx import AsyncClient
-from main import app, ingestion_jobs, task_queue, BatchStatus, Priority
+import main
+from main import app, task_queue, BatchStatus, Priority, TokenBucket
 import time
 
 @pytest.fixture
@@ -83,15 +86,203 @@ async def test_rate_limit(client):
 @pytest.mark.asyncio
 async def test_invalid_id(client):
     response = await client.post("/ingest", json={"ids": [0], "priority": "MEDIUM"})
-    assert response.status_code == 400
-    assert "out of valid range" in response.json()["detail"]
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "greater_than_equal"
     
     response = await client.post("/ingest", json={"ids": [10**9 + 8], "priority": "MEDIUM"})
-    assert response.status_code == 400
-    assert "out of valid range" in response.json()["detail"]
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "less_than_equal"
+    
+    # Beyond int64: must still be a validation error, not a 500
+    response = await client.post("/ingest", json={"ids": [2**63], "priority": "MEDIUM"})
+    assert response.status_code == 422
 
 @pytest.mark.asyncio
 async def test_invalid_ingestion_id(client):
     response = await client.get("/status/invalid_id")
     assert response.status_code == 404
-    assert "Ingestion ID not found" in response.json()["detail"]
\ No newline at end of file
+    assert "Ingestion ID not found" in response.json()["detail"]
+
+@pytest.mark.asyncio
+async def test_token_bucket_try_acquire():
+    bucket = TokenBucket(rate=10, capacity=1)
+    assert await bucket.try_acquire() == 0  # Full bucket: token taken
+    wait = await bucket.try_acquire()  # Empty bucket: next token ~1/rate away
+    assert 0.09 < wait <= 0.1
+
+
+@pytest.mark.asyncio
+async def test_status_etag(client):
+    response = await client.post("/ingest", json={"ids": [1, 2, 3], "priority": "LOW"})
+    ingestion_id = response.json()["ingestion_id"]
+
+    response = await client.get(f"/status/{ingestion_id}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    response = await client.get(f"/status/{ingestion_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    # A batch transition must invalidate both the ETag and the cached body
+    batch_id = (await client.get(f"/status/{ingestion_id}")).json()["batches"][0]["batch_id"]
+    main.set_batch_status(ingestion_id, batch_id, main._TRIGGERED)
+    response = await client.get(f"/status/{ingestion_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    status = response.json()
+    assert status["status"] == "triggered"
+    assert status["batches"][0]["status"] == "triggered"
+
+
+@pytest.mark.asyncio
+async def test_dispatch_paced_after_idle(monkeypatch):
+    dispatched_at = []
+
+    async def record_batch(ingestion_id, batch_id, ids):
+        dispatched_at.append(time.monotonic())
+
+    monkeypatch.setattr(main, "rate_limiter", TokenBucket(rate=10, capacity=1))
+    monkeypatch.setattr(main, "process_batch", record_batch)
+    while not task_queue.empty():
+        task_queue.get_nowait()
+        task_queue.task_done()
+
+    await main.startup_event()
+    try:
+        # Let the workers sit idle long enough for the bucket to refill
+        await asyncio.sleep(0.3)
+        for n in range(4):
+            task_queue.put_nowait((0, next(main._seq), "ingestion", f"batch-{n}", [n]))
+        await asyncio.sleep(1)
+    finally:
+        for task in main.worker_tasks:
+            task.cancel()
+        main.worker_tasks.clear()
+
+    assert len(dispatched_at) == 4
+    gaps = [b - a for a, b in zip(dispatched_at, dispatched_at[1:])]
+    assert all(gap >= 0.09 for gap in gaps)
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_status(client, monkeypatch):
+    monkeypatch.setattr(main, "redis_client", fakeredis.aioredis.FakeRedis())
+
+    response = await client.post("/ingest", json={"ids": [1, 2, 3, 4], "priority": "HIGH"})
+    assert response.status_code == 200
+    ingestion_id = response.json()["ingestion_id"]
+
+    response = await client.get(f"/status/{ingestion_id}")
+    assert response.status_code == 200
+    status = response.json()
+    assert status["status"] == "yet_to_start"
+    assert [batch["ids"] for batch in status["batches"]] == [[1, 2, 3], [4]]
+    etag = response.headers["etag"]
+
+    response = await client.get(f"/status/{ingestion_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    batch_id = status["batches"][0]["batch_id"]
+    await main.redis_set_batch_status(ingestion_id, batch_id, BatchStatus.YET_TO_START, BatchStatus.TRIGGERED)
+    response = await client.get(f"/status/{ingestion_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["status"] == "triggered"
+
+    response = await client.get("/status/invalid_id")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_status_served_from_archive(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "ARCHIVE_DB_PATH", str(tmp_path / "ingestions.db"))
+    monkeypatch.setattr(main, "_archive_db", None)
+
+    response = await client.post("/ingest", json={"ids": [1, 2], "priority": "MEDIUM"})
+    ingestion_id = response.json()["ingestion_id"]
+    batch_id = (await client.get(f"/status/{ingestion_id}")).json()["batches"][0]["batch_id"]
+    await main.transition_batch(ingestion_id, batch_id, BatchStatus.YET_TO_START, BatchStatus.TRIGGERED)
+    await main.transition_batch(ingestion_id, batch_id, BatchStatus.TRIGGERED, BatchStatus.COMPLETED)
+
+    # Drop the in-memory copy so /status has to read SQLite
+    main.completed_jobs.clear()
+    response = await client.get(f"/status/{ingestion_id}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    etag = response.headers["etag"]
+
+    main.completed_jobs.clear()
+    response = await client.get(f"/status/{ingestion_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_redis_rate_limiter_spaces_dispatches():
+    limiter = main.RedisRateLimiter(fakeredis.aioredis.FakeRedis(), rate=10)
+    assert await limiter.try_acquire() == 0
+    wait = await limiter.try_acquire()  # Next slot is ~1/rate seconds away
+    assert 0.05 < wait <= 0.1
+
+
+@pytest.mark.asyncio
+async def test_redis_queue_is_fifo_within_priority(client, monkeypatch):
+    monkeypatch.setattr(main, "redis_client", fakeredis.aioredis.FakeRedis())
+
+    await client.post("/ingest", json={"ids": [1, 2, 3, 4], "priority": "LOW"})
+    await client.post("/ingest", json={"ids": [6, 7, 8, 9], "priority": "HIGH"})
+    await client.post("/ingest", json={"ids": [10], "priority": "HIGH"})
+
+    popped = []
+    for _ in range(5):
+        member, _ = await main.redis_next_batch()
+        popped.append(orjson.loads(member)[2])
+    assert popped == [[6, 7, 8], [9], [10], [1, 2, 3], [4]]
+
+
+@pytest.mark.asyncio
+async def test_redis_completed_ingestion_expires(client, monkeypatch):
+    monkeypatch.setattr(main, "redis_client", fakeredis.aioredis.FakeRedis())
+
+    response = await client.post("/ingest", json={"ids": [1, 2], "priority": "MEDIUM"})
+    ingestion_id = response.json()["ingestion_id"]
+    batch_id = (await client.get(f"/status/{ingestion_id}")).json()["batches"][0]["batch_id"]
+    keys = [f"ingest:{ingestion_id}" + suffix for suffix in ("", ":batches", ":batch_status", ":counts")]
+
+    await main.redis_set_batch_status(ingestion_id, batch_id, BatchStatus.YET_TO_START, BatchStatus.TRIGGERED)
+    assert [await main.redis_client.ttl(key) for key in keys] == [-1] * 4
+
+    await main.redis_set_batch_status(ingestion_id, batch_id, BatchStatus.TRIGGERED, BatchStatus.COMPLETED)
+    ttls = [await main.redis_client.ttl(key) for key in keys]
+    assert all(0 < ttl <= main.ARCHIVE_RETENTION for ttl in ttls)
+
+
+@pytest.mark.asyncio
+async def test_workers_survive_failing_batches(monkeypatch):
+    processed = []
+
+    async def flaky_batch(ingestion_id, batch_id, ids):
+        if batch_id.startswith("bad"):
+            raise RuntimeError("external API failed")
+        processed.append(batch_id)
+
+    monkeypatch.setattr(main, "rate_limiter", TokenBucket(rate=100, capacity=1))
+    monkeypatch.setattr(main, "process_batch", flaky_batch)
+    while not task_queue.empty():
+        task_queue.get_nowait()
+        task_queue.task_done()
+
+    await main.startup_event()
+    try:
+        # More failures than workers: the pool must still process the good batch
+        for n in range(main.BATCH_WORKERS + 1):
+            task_queue.put_nowait((0, next(main._seq), "ingestion", f"bad-{n}", [n]))
+        task_queue.put_nowait((0, next(main._seq), "ingestion", "good", [0]))
+        await asyncio.sleep(0.5)
+        assert not any(task.done() for task in main.worker_tasks)
+    finally:
+        for task in main.worker_tasks:
+            task.cancel()
+        main.worker_tasks.clear()
+
+    assert processed == ["good"]